@@ -2,25 +2,47 @@
 
 from __future__ import annotations
 
-import importlib.util
+import concurrent.futures
+import functools
 import json
 import logging
 import os
+import re
 import shlex
 import shutil
 import subprocess
 import tempfile
 import warnings
-from datetime import datetime
+from datetime import datetime, timezone
+from itertools import chain
 from os import PathLike
 from pathlib import Path
-from subprocess import PIPE
+from subprocess import DEVNULL, PIPE
 from typing import IO, TYPE_CHECKING, Any, Literal, TypeAlias
 
-from ruamel.yaml import YAML
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader  # type: ignore[assignment]
+
+try:
+    import orjson
+
+    _HAS_ORJSON = True
+except ImportError:  # pragma: no cover
+    _HAS_ORJSON = False
+
+try:
+    import conda_index.api
+
+    _HAS_CONDA_INDEX = True
+except ImportError:  # pragma: no cover
+    _HAS_CONDA_INDEX = False
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Iterable, Sequence
 
 StrPath: TypeAlias = str | PathLike[str]
 """str or PathLike"""
@@ -40,30 +62,132 @@ PLATFORM: TypeAlias = Literal[
 SRC_PREFIX = "Copying source from url: "
 BLD_PREFIX = "Build variant: "
 
+# flags of the boolean and optional arguments of `rattler_build`
+BOOLEAN_FLAGS = (
+    "--quiet",
+    "--ignore-recipe-variants",
+    "--render-only",
+    "--with-solve",
+    "--keep_build",
+    "--no-build-id",
+    "--experimental",
+    "--no-include-recipe",
+    "--color-build-log",
+)
+OPTIONAL_FLAGS = (
+    "--recipe-dir",
+    "--up-to",
+    "--target-platform",
+    "--variant-config",
+    "--wrap-log-lines",
+    "--compression-threads",
+    "--noarch-build-platform",
+)
+
+# plain or simply quoted value of the `name:` key, see `_scan_package_name`
+NAME_VALUE_PATTERN = re.compile(r"\"([^\"\\]+)\"|'([^']+)'|([\w.+-]+)")
+
+# the local timezone offset, resolved once per process
+_LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+# output_dir -> subdirs with packages not yet indexed
+_PENDING_INDEX: dict[Path, set[str | None]] = {}
+
 logger = logging.getLogger(__name__)
 
 
+def _json_dumps(obj: Any) -> str:
+    """Serialize `obj` to a json string, using orjson if available."""
+    if _HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def _json_loads(data: str | bytes) -> Any:
+    """Deserialize the json string `data`, using orjson if available."""
+    if _HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def _dump_jsonl(data: Sequence[dict[str, Any]], fd: IO[str]) -> None:
     """Dump the sequence of dicts linewise to `fd`."""
-    for line in data:
-        fd.write(json.dumps(line) + "\n")
+    fd.write("".join(_json_dumps(line) + "\n" for line in data))
 
 
-def _get_package_name(recipe: StrPath) -> str:
-    """Return the package name from the `recipe.yaml` file in `recipe`."""
-    with (Path(recipe) / "recipe.yaml").open() as f:
-        yaml = YAML(typ="rt")
-        recipe_content = yaml.load(f)
+def _scan_package_name(content: str) -> str | None:
+    """Return `package.name` of a recipe without parsing the whole yaml.
+
+    Only a block-style `package:` mapping with a plain or simply quoted `name:`
+    at its first indentation level is recognized, None is returned for
+    everything else (flow style, templates, escapes, ...).
+    """
+    lines = iter(content.splitlines())
+    for line in lines:
+        if line.partition("#")[0].rstrip() == "package:":
+            break
+    else:
+        return None
+
+    indent: str | None = None
+    for line in lines:
+        stripped = line.lstrip(" \t")
+        if not stripped or stripped.startswith("#"):
+            continue
+        line_indent = line[: len(line) - len(stripped)]
+        if indent is None:
+            indent = line_indent
+        if not line_indent or not line_indent.startswith(indent):
+            return None  # end of the `package:` block
+        if line_indent != indent:
+            continue  # nested mapping
+        key, sep, value = stripped.partition(":")
+        if key == "name" and sep:
+            return _parse_name_value(value)
+    return None
+
+
+def _parse_name_value(value: str) -> str | None:
+    """Return the plain or simply quoted scalar `value` or None if it is not."""
+    value = value.strip()
+    match = NAME_VALUE_PATTERN.match(value)
+    if match is None:
+        return None
+    rest = value[match.end() :].lstrip()
+    if rest and not rest.startswith("#"):
+        return None
+    return match[1] or match[2] or match[3]
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_recipe_cached(path: str, mtime_ns: int, size: int) -> str:  # noqa: ARG001
+    """Return the package name from the recipe file at `path`.
+
+    `mtime_ns` and `size` are only part of the cache key to invalidate on edits.
+    """
+    content = Path(path).read_bytes()
+    if name := _scan_package_name(content.decode(errors="replace")):
+        return name
 
+    recipe_content = yaml.load(content, Loader=SafeLoader)
     return recipe_content["package"]["name"]  # type: ignore[no-any-return]
 
 
+def _get_package_name(recipe: StrPath) -> str:
+    """Return the package name from the `recipe.yaml` file in `recipe`."""
+    # absolute (without resolving) to not confuse relative paths from other cwds
+    recipe_file = Path(recipe).absolute() / "recipe.yaml"
+    st = recipe_file.stat()
+    return _parse_recipe_cached(str(recipe_file), st.st_mtime_ns, st.st_size)
+
+
 def _remove_empty_folder(folder: StrPath) -> None:
     """Remove `folder` if it exists and is empty."""
-    folder = Path(folder)
-    if folder.is_dir() and not any(folder.iterdir()):
-        folder.rmdir()
-        logger.debug("Removed empty folder: %s", folder)
+    try:
+        Path(folder).rmdir()
+    except OSError:  # missing, not a directory or not empty
+        return
+    logger.debug("Removed empty folder: %s", folder)
 
 
 def _get_msg(log_line: dict) -> str:
@@ -71,33 +195,73 @@ def _get_msg(log_line: dict) -> str:
     return log_line["fields"]["message"]  # type:ignore[no-any-return]
 
 
+def _find_src_msg(logs: Sequence[dict[str, Any]]) -> str:
+    """Return the first message starting with `SRC_PREFIX` after the variant lines."""
+    for i in range(2, len(logs)):
+        fields = logs[i].get("fields")
+        msg: str = fields["message"] if fields else ""
+        if msg.startswith(SRC_PREFIX):
+            return msg
+    raise RuntimeError("no source message found in logs")
+
+
+def _first_token(text: str) -> str:
+    """Return the first shell-like token of `text`.
+
+    Only falls back to `shlex.split` if `text` contains quotes or escapes.
+    """
+    if "'" in text or '"' in text or "\\" in text:
+        return shlex.split(text)[0]
+    return text.split(maxsplit=1)[0]
+
+
+def _find_packages(output_dir: Path, filename: str) -> list[Path]:
+    """Return all paths to `filename` in the subdirs of `output_dir`.
+
+    Falls back to a recursive search if not found in `{output_dir}/{subdir}`.
+    """
+    with os.scandir(output_dir) as it:
+        matches = [
+            path
+            for entry in it
+            if entry.is_dir() and (path := Path(entry.path, filename)).is_file()
+        ]
+    return matches or list(output_dir.rglob(filename))
+
+
 def _get_local_ts(iso_dt: str | datetime) -> int:
-    """Append the local tz to UTC or naive `iso_dt` and returns its timestamp."""
+    """Return the timestamp of `iso_dt`.
+
+    A rattler-build log timestamp (UTC, `...Z`) is converted directly to its epoch.
+    A datetime is converted to the local tz whose wall time is read as UTC.
+    """
     if isinstance(iso_dt, str):
-        iso_dt = datetime.strptime(iso_dt, "%Y-%m-%dT%H:%M:%S.%fZ")  # noqa: DTZ007
-    # Get the current local time with the system's local timezone
-    local_time = datetime.now()  # noqa: DTZ005
-    # Get the local timezone offset
-    local_tz = local_time.astimezone().tzinfo
-    updated_dt = iso_dt.astimezone(local_tz)
+        # fixed format: YYYY-MM-DDTHH:MM:SS.ffffffZ (fractions truncated anyway)
+        return int(
+            datetime(
+                int(iso_dt[0:4]),
+                int(iso_dt[5:7]),
+                int(iso_dt[8:10]),
+                int(iso_dt[11:13]),
+                int(iso_dt[14:16]),
+                int(iso_dt[17:19]),
+                tzinfo=timezone.utc,
+            ).timestamp()
+        )
+    updated_dt = iso_dt.astimezone(_LOCAL_TZ)
     updated_tz = updated_dt.tzinfo
     if updated_tz is None:
         raise ValueError("local timezone transfer failed")
     return int(updated_tz.fromutc(updated_dt).timestamp())
 
 
-def _clean_output(  # noqa: C901, PLR0912
+def _get_caches(
     recipe: StrPath,
-    output_dir: StrPath,
-    package_format: Literal["tar-bz2", "conda"],
+    output_dir: Path,
     skip_existing: bool | Literal["all"],
     logs: Sequence[dict[str, Any]],
-    clean_bld_cache: bool = True,
-    clean_src_cache: bool = True,
-) -> Path:
-    """Remove build and source directory if provided."""
-    recipe = Path(recipe).resolve()
-    output_dir = Path(output_dir).resolve()
+) -> tuple[Path, Path | None, str]:
+    """Return the build dir, the source cache file (None if skipped) and the variant."""
     # line 0 -> found N variants
     # line 1 -> build variant: ...
     variant_line = logs[1]
@@ -114,23 +278,27 @@ def _clean_output(  # noqa: C901, PLR0912
             not_skipped = False
     logger.debug("Build process was%sskipped", " not " if not_skipped else " ")
 
-    bld_dir_exists = bld_dir.is_dir()
-
-    if bld_dir_exists != not_skipped:
-        raise ValueError("bld dir exists but it shouldnt or vice versa")
-
+    src_file = None
     if not_skipped:
-        src_msg = next(
-            msg for line in logs[2:] if (msg := _get_msg(line)).startswith(SRC_PREFIX)
-        )
-        src_file_str, *_ = shlex.split(src_msg.removeprefix(SRC_PREFIX))
-        src_file = Path(src_file_str)
+        src_msg = _find_src_msg(logs)
+        src_file = Path(_first_token(src_msg.removeprefix(SRC_PREFIX)))
+    return bld_dir, src_file, variant
 
-        if not src_file.is_file():
-            raise RuntimeError("should not happen")
 
+def _remove_caches(
+    output_dir: Path,
+    bld_dir: Path | None,
+    src_file: Path | None,
+    clean_bld_cache: bool = True,
+    clean_src_cache: bool = True,
+) -> None:
+    """Remove the build dir and source cache file if provided.
+
+    An already removed source cache file is ignored, as builds may share it.
+    """
+    if src_file is not None:
         if clean_src_cache:
-            src_file.unlink()
+            src_file.unlink(missing_ok=True)
             logger.debug("Removed source cache: %s", src_file)
         else:
             logger.debug("Source cache kept at: %s", src_file)
@@ -139,13 +307,41 @@ def _clean_output(  # noqa: C901, PLR0912
         _remove_empty_folder(output_dir / "src_cache")
 
     if clean_bld_cache:
-        if bld_dir_exists:
+        if bld_dir is not None:
             shutil.rmtree(bld_dir)
             logger.debug("Removed build cache: %s", bld_dir)
         _remove_empty_folder(output_dir / "bld")
-    elif bld_dir_exists:
+    elif bld_dir is not None:
         logger.debug("Build cache kept at: %s", bld_dir)
 
+
+def _clean_output(
+    recipe: StrPath,
+    output_dir: StrPath,
+    package_format: Literal["tar-bz2", "conda"],
+    skip_existing: bool | Literal["all"],
+    logs: Sequence[dict[str, Any]],
+    clean_bld_cache: bool = True,
+    clean_src_cache: bool = True,
+) -> Path:
+    """Remove build and source directory if provided."""
+    output_dir = Path(output_dir).resolve()
+    bld_dir, src_file, variant = _get_caches(recipe, output_dir, skip_existing, logs)
+
+    bld_dir_exists = bld_dir.is_dir()
+    if bld_dir_exists != (src_file is not None):
+        raise ValueError("bld dir exists but it shouldnt or vice versa")
+    if src_file is not None and not src_file.is_file():
+        raise RuntimeError("should not happen")
+
+    _remove_caches(
+        output_dir,
+        bld_dir if bld_dir_exists else None,
+        src_file,
+        clean_bld_cache,
+        clean_src_cache,
+    )
+
     if package_format == "tar-bz2":
         ext = ".tar.bz2"
     elif package_format == "conda":
@@ -153,7 +349,7 @@ def _clean_output(  # noqa: C901, PLR0912
     else:
         raise ValueError(f"Unknown package-format: {package_format}")
 
-    matches = list(output_dir.rglob(f"{variant}{ext}"))
+    matches = _find_packages(output_dir, f"{variant}{ext}")
     if len(matches) != 1:
         raise RuntimeError(f"none or multiple output packages found: {matches}")
     match = matches[0]
@@ -161,7 +357,42 @@ def _clean_output(  # noqa: C901, PLR0912
     return match
 
 
-def rattler_build(  # noqa: C901, PLR0913
+@functools.lru_cache(maxsize=8)
+def _find_rattler_build(conda_prefix: str) -> Path:
+    """Return the rattler-build executable in `conda_prefix`."""
+    rattler_build_exec = Path(conda_prefix).resolve() / "bin" / "rattler-build"
+
+    if not rattler_build_exec.is_file():
+        raise FileNotFoundError("rattler-build not found.")
+    return rattler_build_exec
+
+
+def _get_subdir(pkg: Path, output_dir: StrPath) -> str | None:
+    """Return the subdir of `pkg` or None if it is not directly in one."""
+    subdir = pkg.parent
+    return subdir.name if subdir.parent == Path(output_dir).resolve() else None
+
+
+def _run_conda_index(output_dir: StrPath, subdirs: Iterable[str | None]) -> None:
+    """Update the index of `subdirs` in `output_dir` with conda_index if available.
+
+    `noarch` is always included, as every channel requires it.
+    If any subdir is None, the whole `output_dir` is indexed.
+    """
+    if _HAS_CONDA_INDEX:
+        subdir_set = set(subdirs)
+        if None in subdir_set:
+            conda_index.api.update_index(output_dir)
+            logger.debug("conda_index run on %s", output_dir)
+            return
+        names = sorted({"noarch", *(x for x in subdir_set if x is not None)})
+        conda_index.api.update_index(output_dir, subdirs=names)
+        logger.debug("conda_index run on %s (%s)", output_dir, ", ".join(names))
+    else:
+        logger.warning("conda_index not available. indexing skipped.")
+
+
+def rattler_build(  # noqa: PLR0913
     recipe: StrPath = Path(),
     recipe_dir: StrPath | None = None,
     up_to: str | None = None,
@@ -292,10 +523,7 @@ def rattler_build(  # noqa: C901, PLR0913
     conda_prefix = os.getenv("CONDA_PREFIX")
     if not conda_prefix:
         raise FileNotFoundError("No conda prefix found.")
-    rattler_build_exec = Path(conda_prefix).resolve() / "bin" / "rattler-build"
-
-    if not rattler_build_exec.is_file():
-        raise FileNotFoundError("rattler-build not found.")
+    rattler_build_exec = _find_rattler_build(conda_prefix)
 
     # fmt: off
     args: list[str | Path] = [
@@ -312,30 +540,27 @@ def rattler_build(  # noqa: C901, PLR0913
     # fmt: on
 
     # add channels
-    for channel in channels:
-        args.extend(("--channel", channel))
+    args += chain.from_iterable(("--channel", channel) for channel in channels)
     # add verbosity
-    args.extend("--verbose" for _ in range(verbose))
+    args += ["--verbose"] * verbose
 
     # package
 
-    # boolean values:
-    # fmt: off
-    boolean_values = [
-        (quiet, "--quiet"),
-        (ignore_recipe_variants, "--ignore-recipe-variants"),
-        (render_only, "--render-only"),
-        (with_solve, "--with-solve"),
-        (keep_build, "--keep_build"),
-        (no_build_id, "--no-build-id"),
-        (experimental, "--experimental"),
-        (no_include_recipe, "--no-include-recipe"),
-        (color_build_log, "--color-build-log"),
+    # boolean values (same order as BOOLEAN_FLAGS):
+    boolean_values = (
+        quiet,
+        ignore_recipe_variants,
+        render_only,
+        with_solve,
+        keep_build,
+        no_build_id,
+        experimental,
+        no_include_recipe,
+        color_build_log,
+    )
+    args += [
+        flag for arg, flag in zip(boolean_values, BOOLEAN_FLAGS, strict=True) if arg
     ]
-    # fmt: on
-    for arg, flag in boolean_values:
-        if arg:
-            args.append(flag)
 
     # deprecated:
     if no_test:
@@ -346,26 +571,27 @@ def rattler_build(  # noqa: C901, PLR0913
         )
         args.append("--no-test")
 
-    # optional values:
-    # fmt: off
-    optional_values: list[tuple[Any, str]] = [
-        (recipe_dir, "--recipe-dir"),
-        (up_to, "--up-to"),
-        (target_platform, "--target-platform"),
-        (variant_config, "--variant-config"),
-        (wrap_log_lines, "--wrap-log-lines"),
-        (compression_threads, "--compression-threads"),
-        (noarch_build_platform, "--noarch-build-platform"),
-    ]
-    # fmt: on
-    for arg, flag in optional_values:
-        if arg is not None:
-            args.extend((flag, shlex.quote(str(arg))))
+    # optional values (same order as OPTIONAL_FLAGS):
+    optional_values: tuple[Any, ...] = (
+        recipe_dir,
+        up_to,
+        target_platform,
+        variant_config,
+        wrap_log_lines,
+        compression_threads,
+        noarch_build_platform,
+    )
+    args += chain.from_iterable(
+        (flag, str(arg))
+        for arg, flag in zip(optional_values, OPTIONAL_FLAGS, strict=True)
+        if arg is not None
+    )
 
     # special:
     if extra_meta:
-        for key, value in extra_meta.items():
-            args.extend(("--extra-meta", shlex.quote(f"{key}={value}")))
+        args += chain.from_iterable(
+            ("--extra-meta", f"{key}={value}") for key, value in extra_meta.items()
+        )
 
     # package format:
     fmt = (
@@ -375,17 +601,23 @@ def rattler_build(  # noqa: C901, PLR0913
     )
     args.extend(("--package-format", fmt))
 
-    logger.debug("rattler-build: %s", " ".join(str(x) for x in args))
+    # stringify the Paths once for both logging and Popen
+    argv = [os.fspath(arg) for arg in args]
 
-    # custom strings (e.g. extra-meta are quoted)
-    # else is either boolean of Paths/ints/Literals (but not enforced!)
-    proc = subprocess.Popen(args, stdout=PIPE, stderr=PIPE, text=True)  # noqa: S603
-    stdout, stderr = proc.communicate()
+    # quote only for the human-readable command, argv is passed without a shell
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("rattler-build: %s", shlex.join(argv))
 
-    if stdout != "":
-        raise RuntimeError("stdout should be empty")
-
-    logs = [json.loads(line) for line in stderr.splitlines()]
+    # stdout should be empty, the json logs are streamed from stderr
+    with subprocess.Popen(argv, stdout=DEVNULL, stderr=PIPE, text=True) as proc:  # noqa: S603
+        if proc.stderr is None:  # pragma: no cover
+            raise RuntimeError("stderr should be piped")
+        try:
+            logs = [_json_loads(line) for line in proc.stderr]
+        except BaseException:
+            # e.g. non-json output, do not leave the build running unattended
+            proc.kill()
+            raise
 
     return logs, proc.returncode
 
@@ -395,7 +627,7 @@ def optimized_rattler_build(  # noqa: PLR0913
     output_dir: StrPath,
     clean_bld_cache: bool = True,
     clean_src_cache: bool = True,
-    run_conda_index: bool = True,
+    run_conda_index: bool | Literal["batch"] = True,
     check: bool = True,
     build_platform: PLATFORM = "linux-64",
     target_platform: PLATFORM | None = None,
@@ -430,7 +662,8 @@ def optimized_rattler_build(  # noqa: PLR0913
         clean_src_cache: added. delete src_cache subfolder after successful finish.
             [default: True]
         run_conda_index: added. update the `output_dir` index with conda_index
-            after successfzul finish.
+            after successfzul finish. Only the subdir of the package is reindexed.
+            If set to `batch`, defer the update until `flush_index` is called.
             [default: True]
         check: added. raise RuntimeError when rattler-build failed. [default: True]
         build_platform: forwarded.
@@ -498,24 +731,138 @@ def optimized_rattler_build(  # noqa: PLR0913
             clean_src_cache,
         )
 
-        if run_conda_index:
-            has_conda = importlib.util.find_spec("conda_index")
-            if has_conda:
-                import conda_index.api
-
-                conda_index.api.update_index(output_dir)
-                logger.debug("conda_index run on %s", output_dir)
-            else:
-                logger.warning("conda_index not available. indexing skipped.")
+        subdir = _get_subdir(pkg, output_dir)
+        if run_conda_index == "batch":
+            key = Path(output_dir).resolve()
+            _PENDING_INDEX.setdefault(key, set()).add(subdir)
+        elif run_conda_index:
+            _run_conda_index(output_dir, (subdir,))
     else:
         logger.error(
             "rattler-build failed. directories not removed. check returned logs."
         )
         if check:
-            with tempfile.NamedTemporaryFile("w") as f:
+            with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
                 _dump_jsonl(logs, f)
             raise RuntimeError(f"rattler-build failed. logs written to: {f.name}")
     return pkg, logs, code
 
 
-__all__ = ["PLATFORM", "optimized_rattler_build", "rattler_build"]
+def optimized_rattler_build_many(
+    recipes: Sequence[StrPath],
+    output_dir: StrPath,
+    *,
+    max_workers: int | None = None,
+    clean_bld_cache: bool = True,
+    clean_src_cache: bool = True,
+    run_conda_index: bool = True,
+    package_format: Literal["tar-bz2", "conda"] = "conda",
+    skip_existing: bool | Literal["all"] = True,
+    **kwargs: Any,
+) -> list[tuple[Path | None, list[dict[str, Any]], int]]:
+    """Build multiple packages in parallel with `optimized_rattler_build`.
+
+    All builds share `output_dir`. rattler-build updates the `repodata.json`
+    of each subdir after every build, so concurrent builds may race on it.
+    With `run_conda_index` the index is rebuilt once after all builds finished,
+    otherwise it may be stale. The caches are removed only after all builds
+    finished, so no build removes a folder another one is about to use.
+
+    Args:
+        recipes: The recipes to build.
+        output_dir: The shared output directory.
+        max_workers: The number of parallel builds. Defaults to the number of cpus
+            divided by `compression_threads` (or 2 if not set).
+        clean_bld_cache: delete the bld subfolder after all builds finished.
+            [default: True]
+        clean_src_cache: delete the src_cache subfolder after all builds finished.
+            [default: True]
+        run_conda_index: update the `output_dir` index with conda_index
+            once after all builds finished.
+            [default: True]
+        package_format: forwarded.
+        skip_existing: forwarded.
+        kwargs: forwarded to `optimized_rattler_build`.
+
+    Returns:
+        The results of `optimized_rattler_build` in the order of `recipes`.
+
+    Raises:
+        RuntimeError: If `check` is True and any `rattler-build` exits non-zero.
+            The first failure is raised after the successful builds were cleaned
+            and indexed.
+    """
+    if max_workers is None:
+        threads = kwargs.get("compression_threads") or 2
+        max_workers = max(1, (os.cpu_count() or 1) // threads)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                optimized_rattler_build,
+                recipe,
+                output_dir,
+                clean_bld_cache=False,
+                clean_src_cache=False,
+                run_conda_index=False,
+                package_format=package_format,
+                skip_existing=skip_existing,
+                **kwargs,
+            )
+            for recipe in recipes
+        ]
+    # the executor waited for all builds, so collecting never blocks
+    resolved_dir = Path(output_dir).resolve()
+    results: list[tuple[Path | None, list[dict[str, Any]], int]] = []
+    errors: list[BaseException] = []
+    for recipe, future in zip(recipes, futures, strict=True):
+        if (error := future.exception()) is not None:
+            logger.error("building %s failed: %s", recipe, error)
+            errors.append(error)
+            continue
+        result = future.result()
+        results.append(result)
+        if result[0] is None or not (clean_bld_cache or clean_src_cache):
+            continue
+        # the package was already located and checked by the worker
+        try:
+            bld_dir, src_file, _ = _get_caches(
+                recipe, resolved_dir, skip_existing, result[1]
+            )
+            _remove_caches(
+                resolved_dir,
+                bld_dir if bld_dir.is_dir() else None,
+                src_file,
+                clean_bld_cache,
+                clean_src_cache,
+            )
+        except Exception as exc:
+            logger.exception("cleaning the caches of %s failed", recipe)
+            errors.append(exc)
+
+    subdirs = {_get_subdir(pkg, output_dir) for pkg, _, _ in results if pkg is not None}
+    if run_conda_index and subdirs:
+        _run_conda_index(output_dir, subdirs)
+    if errors:
+        raise errors[0]
+    return results
+
+
+def flush_index(output_dir: StrPath) -> None:
+    """Update the index of `output_dir` deferred by `run_conda_index="batch"`.
+
+    Args:
+        output_dir: The output directory of the batched builds.
+    """
+    subdirs = _PENDING_INDEX.pop(Path(output_dir).resolve(), None)
+    if subdirs:
+        _run_conda_index(output_dir, subdirs)
+
+
+__all__ = [
+    "PLATFORM",
+    "flush_index",
+    "optimized_rattler_build",
+    "optimized_rattler_build_many",
+    "rattler_build",
+]
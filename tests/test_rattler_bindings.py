@@ -0,0 +1,316 @@
+"""Tests for rattler_bindings."""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any
+
+import pytest
+import yaml
+
+import rattler_bindings
+from rattler_bindings import (
+    BLD_PREFIX,
+    SRC_PREFIX,
+    _get_local_ts,
+    _get_package_name,
+    _scan_package_name,
+    flush_index,
+    optimized_rattler_build,
+    optimized_rattler_build_many,
+    rattler_build,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from rattler_bindings import StrPath
+
+# id -> (recipe.yaml content, expected result of the fast path)
+RECIPES = {
+    "plain": ("package:\n  name: foo\n  version: 1\n", "foo"),
+    "single_quoted": (
+        "context:\n  v: 1\npackage:\n  version: 1\n  name: 'bar-baz'\n",
+        "bar-baz",
+    ),
+    "double_quoted": ('package:\n  name: "q.x"\n', "q.x"),
+    "commented": (
+        "package:\n\n  # comment\n  version: 1 # c\n  name: foo_1 # c\n",
+        "foo_1",
+    ),
+    "templated": ("context:\n  name: foo\npackage:\n  name: ${{ name }}\n", None),
+    "crlf": ("package:\r\n  version: 1\r\n  name: crlf\r\n", "crlf"),
+    "nested": ("package:\n  extra:\n    name: nested\n  name: outer\n", "outer"),
+    "four_spaces": ("package:\n    name: four\n", "four"),
+    "escaped": ('package:\n  name: "esc\\x41"\n', None),
+    "flow": ("package: {name: flow, version: 1}\n", None),
+    "after_other_block": ("recipe:\n  name: x\npackage:\n  name: y\n", "y"),
+    "whitespace_lines": (
+        "package:\n  version: 1\n" + "  \n" * 30 + "  name: ws\n",
+        "ws",
+    ),
+    "whitespace_templated": (
+        "package:\n" + "  \n" * 30 + "  name: ${{ name }}\n",
+        None,
+    ),
+}
+
+
+@pytest.mark.parametrize(("content", "fast"), RECIPES.values(), ids=RECIPES.keys())
+def test_scan_package_name(content: str, fast: str | None) -> None:
+    name = _scan_package_name(content)
+    assert name == fast
+    if name is not None:
+        assert name == yaml.safe_load(content)["package"]["name"]
+
+
+@pytest.mark.parametrize(
+    "content", [content for content, _ in RECIPES.values()], ids=RECIPES.keys()
+)
+def test_get_package_name(content: str, tmp_path: Path) -> None:
+    (tmp_path / "recipe.yaml").write_text(content, newline="")
+    expected = yaml.safe_load(content)["package"]["name"]
+    assert _get_package_name(tmp_path) == expected
+
+
+def test_get_package_name_relative(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    for name in ("foo", "bar"):
+        recipe_file = tmp_path / name / "recipe" / "recipe.yaml"
+        recipe_file.parent.mkdir(parents=True)
+        recipe_file.write_text(f"package:\n  name: {name}\n")
+        os.utime(recipe_file, ns=(0, 0))  # same mtime and size
+
+    for name in ("foo", "bar"):
+        monkeypatch.chdir(tmp_path / name)
+        assert _get_package_name("recipe") == name
+
+
+def test_scan_package_name_unmatched() -> None:
+    assert _scan_package_name("source:\n  name: foo\n") is None
+    nested_only = "package:\n  extra:\n    name: x\nsource:\n  name: y\n"
+    assert _scan_package_name(nested_only) is None
+
+
+def test_scan_package_name_linear() -> None:
+    content = "package:\n" + "  \n" * 10_000 + "  version: 1\n"
+    start = time.perf_counter()
+    assert _scan_package_name(content) is None
+    assert time.perf_counter() - start < 1
+
+
+@pytest.fixture
+def local_tz(request: pytest.FixtureRequest) -> Iterator[None]:
+    """Set the process timezone to `request.param` for the test."""
+    old_tz = os.environ.get("TZ")
+    os.environ["TZ"] = request.param
+    time.tzset()
+    yield
+    if old_tz is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = old_tz
+    time.tzset()
+
+
+@pytest.mark.parametrize(
+    "local_tz", ["UTC", "Europe/Berlin", "America/New_York"], indirect=True
+)
+@pytest.mark.parametrize(
+    ("iso_dt", "expected"),
+    [
+        ("2024-11-30T12:34:56.123456Z", 1732970096),  # winter
+        ("2024-07-01T12:00:00.999999Z", 1719835200),  # summer
+    ],
+)
+@pytest.mark.usefixtures("local_tz")
+def test_get_local_ts(iso_dt: str, expected: int) -> None:
+    assert _get_local_ts(iso_dt) == expected
+
+
+def _fake_recipe(root: Path, name: str, src_file: Path) -> Path:
+    """Create a recipe with the logs and output tree of a finished build."""
+    recipe = root / name
+    recipe.mkdir()
+    (recipe / "recipe.yaml").write_text(f"package:\n  name: {name}\n")
+    output_dir = root / "output"
+    (output_dir / "bld" / f"rattler-build_{name}_1732970096" / "work").mkdir(
+        parents=True
+    )
+    (output_dir / "linux-64").mkdir(exist_ok=True)
+    (output_dir / "linux-64" / f"{name}-1-0.conda").touch()
+    src_file.parent.mkdir(exist_ok=True)
+    src_file.touch()
+    logs = [
+        {"fields": {"message": "Found 1 variants"}},
+        {
+            "timestamp": "2024-11-30T12:34:56.000000Z",
+            "fields": {"message": f"{BLD_PREFIX}{name}-1-0"},
+        },
+        {"fields": {"message": f"{SRC_PREFIX}{src_file} to /work"}},
+    ]
+    (recipe / "logs.json").write_text(json.dumps(logs))
+    return recipe
+
+
+def _fake_build(
+    recipe: Path, output_dir: Path, **kwargs: Any
+) -> tuple[Path | None, list[dict[str, Any]], int]:
+    assert kwargs["clean_bld_cache"] is False
+    assert kwargs["clean_src_cache"] is False
+    assert kwargs["run_conda_index"] is False
+    if recipe.name == "fail":
+        raise RuntimeError("rattler-build failed.")
+    logs = json.loads((recipe / "logs.json").read_text())
+    return output_dir / "linux-64" / f"{recipe.name}-1-0.conda", logs, 0
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="workers only see the monkeypatched build when forked",
+)
+@pytest.mark.parametrize("fail", [False, True])
+def test_optimized_rattler_build_many(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, fail: bool
+) -> None:
+    indexed: list[Iterable[str | None]] = []
+    monkeypatch.setattr(rattler_bindings, "optimized_rattler_build", _fake_build)
+    monkeypatch.setattr(
+        rattler_bindings, "_run_conda_index", lambda _, subdirs: indexed.append(subdirs)
+    )
+    output_dir = tmp_path.resolve() / "output"
+    # both recipes share the same source tarball
+    src_file = output_dir / "src_cache" / "src.tar.gz"
+    recipes = [_fake_recipe(tmp_path, name, src_file) for name in ("a", "b")]
+    if fail:
+        recipes.insert(1, tmp_path / "fail")
+
+    if fail:
+        with pytest.raises(RuntimeError, match="rattler-build failed"):
+            optimized_rattler_build_many(recipes, output_dir, max_workers=2)
+    else:
+        results = optimized_rattler_build_many(recipes, output_dir, max_workers=2)
+        assert [pkg for pkg, _, _ in results] == [
+            output_dir / "linux-64" / "a-1-0.conda",
+            output_dir / "linux-64" / "b-1-0.conda",
+        ]
+    assert not (output_dir / "bld").exists()
+    assert not (output_dir / "src_cache").exists()
+    assert indexed == [{"linux-64"}]
+
+
+def _fake_rattler_build(prefix: Path, script: str) -> None:
+    exe = prefix / "bin" / "rattler-build"
+    exe.parent.mkdir(parents=True)
+    exe.write_text(f"#!{sys.executable}\nimport json, sys\n{script}\n")
+    exe.chmod(0o755)
+
+
+def test_rattler_build(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    _fake_rattler_build(
+        tmp_path, "print(json.dumps({'argv': sys.argv[1:]}), file=sys.stderr)"
+    )
+    monkeypatch.setenv("CONDA_PREFIX", str(tmp_path))
+
+    logs, code = rattler_build(up_to="a b", extra_meta={"key": "c d"})
+    assert code == 0
+    argv = logs[0]["argv"]
+    assert argv[argv.index("--up-to") + 1] == "a b"
+    assert argv[argv.index("--extra-meta") + 1] == "key=c d"
+
+
+def test_rattler_build_non_json(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    _fake_rattler_build(
+        tmp_path,
+        "import time\nprint('error: no json', file=sys.stderr, flush=True)\n"
+        "time.sleep(60)",
+    )
+    monkeypatch.setenv("CONDA_PREFIX", str(tmp_path))
+
+    start = time.perf_counter()
+    with pytest.raises(json.JSONDecodeError):  # also the base of orjson's error
+        rattler_build()
+    assert time.perf_counter() - start < 30
+
+
+def test_optimized_rattler_build_failed_logs(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    logs = [{"fields": {"message": "first"}}, {"fields": {"message": "error"}}]
+    _fake_rattler_build(
+        tmp_path,
+        f"for line in {logs!r}:\n    print(json.dumps(line), file=sys.stderr)\n"
+        "sys.exit(1)",
+    )
+    monkeypatch.setenv("CONDA_PREFIX", str(tmp_path))
+
+    with pytest.raises(RuntimeError, match="logs written to: ") as exc_info:
+        optimized_rattler_build(tmp_path, tmp_path / "output")
+    log_file = Path(str(exc_info.value).rpartition("logs written to: ")[2])
+    try:
+        lines = log_file.read_text().splitlines()
+        assert [json.loads(line) for line in lines] == logs
+    finally:
+        log_file.unlink()
+
+
+@pytest.fixture
+def update_index_calls(monkeypatch: pytest.MonkeyPatch) -> list[tuple[Any, ...]]:
+    """Record the calls to a fake `conda_index.api.update_index`."""
+    calls: list[tuple[Any, ...]] = []
+
+    def update_index(output_dir: StrPath, subdirs: list[str] | None = None) -> None:
+        calls.append((output_dir, subdirs))
+
+    fake_conda_index = SimpleNamespace(api=SimpleNamespace(update_index=update_index))
+    monkeypatch.setattr(
+        rattler_bindings, "conda_index", fake_conda_index, raising=False
+    )
+    monkeypatch.setattr(rattler_bindings, "_HAS_CONDA_INDEX", True)
+    return calls
+
+
+def _fake_successful_build(monkeypatch: pytest.MonkeyPatch, pkg: Path) -> None:
+    monkeypatch.setattr(rattler_bindings, "rattler_build", lambda **_: ([], 0))
+    monkeypatch.setattr(rattler_bindings, "_clean_output", lambda *_: pkg)
+
+
+def test_flush_index(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    update_index_calls: list[tuple[Any, ...]],
+) -> None:
+    _fake_successful_build(monkeypatch, tmp_path / "linux-64" / "a.conda")
+    pending: dict[Path, set[str | None]] = {}
+    monkeypatch.setattr(rattler_bindings, "_PENDING_INDEX", pending)
+
+    optimized_rattler_build(tmp_path, tmp_path, run_conda_index="batch")
+    assert update_index_calls == []
+    assert pending == {tmp_path.resolve(): {"linux-64"}}
+
+    flush_index(tmp_path)
+    assert update_index_calls == [(tmp_path, ["linux-64", "noarch"])]
+    assert not pending
+
+    flush_index(tmp_path)
+    assert len(update_index_calls) == 1
+
+
+def test_run_conda_index_nested_package(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+    update_index_calls: list[tuple[Any, ...]],
+) -> None:
+    _fake_successful_build(monkeypatch, tmp_path / "linux-64" / "nested" / "a.conda")
+
+    optimized_rattler_build(tmp_path, tmp_path)
+    assert update_index_calls == [(tmp_path, None)]